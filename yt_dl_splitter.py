@@ -7,12 +7,15 @@
 
 import os
 import sys
+import asyncio
 import re
-import json
+import bisect
 import shutil
 import subprocess
+import tempfile
 from pathlib import Path
-from typing import Optional, Dict, Any, Iterable, List, Tuple
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Callable, Iterable, List, NamedTuple, Tuple
 
 try:
     from yt_dlp import YoutubeDL
@@ -20,6 +23,21 @@ except ImportError:
     print("Error: yt-dlp is not installed. Run: pip install -r requirements.txt")
     sys.exit(1)
 
+try:
+    import orjson as _json  # optional: faster JSON decode, straight from bytes
+except ImportError:
+    import json as _json
+
+try:
+    from tqdm import tqdm  # optional: nicer progress bar
+except ImportError:
+    tqdm = None
+
+try:
+    import av  # optional: in-process stream probing via PyAV
+except ImportError:
+    av = None
+
 
 # ------------------------- Helpers -------------------------
 
@@ -43,10 +61,12 @@ def prompt_choice(prompt_text: str, choices) -> str:
         print(f"  {i}) {label}")
     while True:
         sel = input("Select number: ").strip()
-        if sel.isdigit():
+        try:
             idx = int(sel) - 1
-            if 0 <= idx < len(normalized):
-                return normalized[idx][1]
+        except ValueError:
+            idx = -1
+        if 0 <= idx < len(normalized):
+            return normalized[idx][1]
         print("Invalid selection. Try again.\n")
 
 
@@ -78,32 +98,31 @@ def build_video_format_selector(max_height: Optional[int]) -> str:
 def parse_height(s: str) -> Optional[int]:
     if s.lower() == "best":
         return None
-    if s.isdigit():
-        return int(s)
-    return None
+    try:
+        height = int(s)
+    except ValueError:
+        return None
+    return height if height > 0 else None
 
 
 # --- Duplicate filename prediction ---
 
-_FORBIDDEN_RE = re.compile(r'[<>:"/\\|?*\x00-\x1F]')  # also strip control chars
+# forbidden filename chars + control chars -> "_"; str.translate is a single C loop
+_FORBIDDEN_TABLE = str.maketrans({c: "_" for c in '<>:"/\\|?*' + "".join(chr(i) for i in range(32))})
+_WHITESPACE_RE = re.compile(r"\s+")
 
 def _sanitize_basename(name: str) -> str:
     s = (name or "").strip()
-    s = _FORBIDDEN_RE.sub("_", s)
-    s = re.sub(r"\s+", " ", s)
+    s = s.translate(_FORBIDDEN_TABLE)
+    s = _WHITESPACE_RE.sub(" ", s)
     s = s.strip(" .")
     if not s:
         s = "untitled"
     return s
 
 def _has_duplicate_after_sanitize(titles: Iterable[str]) -> bool:
-    seen = set()
-    for t in titles:
-        key = _sanitize_basename(t).casefold()
-        if key in seen:
-            return True
-        seen.add(key)
-    return False
+    titles_list = list(titles)
+    return len({_sanitize_basename(t).casefold() for t in titles_list}) != len(titles_list)
 
 def detect_duplicate_chapter_names(info: Dict[str, Any]) -> bool:
     chapters = info.get("chapters") or []
@@ -113,36 +132,228 @@ def detect_duplicate_chapter_names(info: Dict[str, Any]) -> bool:
 
 # --- ffmpeg helpers ---
 
+_FFMPEG_CHECKED = False  # PATH lookup succeeded once; skip it on later calls
+
 def _ensure_ffmpeg() -> None:
+    global _FFMPEG_CHECKED
+    if _FFMPEG_CHECKED:
+        return
     for exe in ("ffmpeg", "ffprobe"):
         if shutil.which(exe) is None:
             raise RuntimeError(
                 f"{exe} not found. Please install FFmpeg and ensure it's on PATH."
             )
+    _FFMPEG_CHECKED = True
 
 def _ts(seconds: float) -> str:
     if seconds is None:
         return ""
-    ms = int(round((seconds - int(seconds)) * 1000))
-    s = int(seconds) % 60
-    m = (int(seconds) // 60) % 60
-    h = int(seconds) // 3600
+    # round once to whole ms so e.g. 11.9996 carries into the seconds (12.000, not 11.1000)
+    total_ms = int(round(seconds * 1000))
+    total_s, ms = divmod(total_ms, 1000)
+    s = total_s % 60
+    m = (total_s // 60) % 60
+    h = total_s // 3600
     return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
 
+# (path, mtime_ns, size) -> (vcodec, acodec); avoids re-spawning ffprobe for the same file
+_ffprobe_cache: Dict[Tuple[str, int, int], Tuple[Optional[str], Optional[str]]] = {}
+
+def _pyav_stream_codecs(src: Path) -> Tuple[Optional[str], Optional[str]]:
+    """Read (vcodec, acodec) in-process through libavformat; no fork/pipe/JSON round-trip.
+
+    canonical_name is the codec ID name (e.g. "av1", "mp3"), matching ffprobe's codec_name;
+    codec_context.name would be the chosen decoder ("libdav1d", "mp3float").
+    """
+    with av.open(str(src)) as container:
+        vcodec = next((s.codec_context.codec.canonical_name for s in container.streams if s.type == "video"), None)
+        acodec = next((s.codec_context.codec.canonical_name for s in container.streams if s.type == "audio"), None)
+    return vcodec, acodec
+
 def _ffprobe_stream_codecs(src: Path) -> Tuple[Optional[str], Optional[str]]:
-    """Return (vcodec, acodec) using ffprobe JSON; may return (None, codec) for audio-only files."""
+    """Return (vcodec, acodec) via PyAV if installed, else ffprobe JSON; may return (None, codec) for audio-only files."""
+    st = src.stat()
+    key = (str(src), st.st_mtime_ns, st.st_size)
+    cached = _ffprobe_cache.get(key)
+    if cached is not None:
+        return cached
+    if av is not None:
+        try:
+            _ffprobe_cache[key] = _pyav_stream_codecs(src)
+            return _ffprobe_cache[key]
+        except Exception:
+            pass  # fall back to ffprobe
     _ensure_ffmpeg()
     cmd = ["ffprobe", "-v", "error", "-show_streams", "-select_streams", "v:0,a:0", "-of", "json", str(src)]
     out = subprocess.check_output(cmd)
-    data = json.loads(out.decode("utf-8", errors="ignore"))
+    data = _json.loads(out)
     vcodec = acodec = None
-    for st in data.get("streams", []):
-        if st.get("codec_type") == "video" and vcodec is None:
-            vcodec = st.get("codec_name")
-        elif st.get("codec_type") == "audio" and acodec is None:
-            acodec = st.get("codec_name")
+    for stream in data.get("streams", []):
+        if stream.get("codec_type") == "video" and vcodec is None:
+            vcodec = stream.get("codec_name")
+        elif stream.get("codec_type") == "audio" and acodec is None:
+            acodec = stream.get("codec_name")
+    _ffprobe_cache[key] = (vcodec, acodec)
     return vcodec, acodec
 
+_KEYFRAME_WINDOW = 10.0  # seconds probed before each chapter start (YouTube GOPs are ~2-5s)
+_keyframe_cache: Dict[Tuple[str, int, int, Tuple[float, ...]], List[float]] = {}
+
+def _keyframe_offsets(src: Path, starts: Iterable[float]) -> List[float]:
+    """Sorted video keyframe times (relative to file start) found just before each of `starts`.
+
+    One ffprobe run reads packet flags only (no decoding) inside a short window per start,
+    instead of scanning the whole file.
+    """
+    starts = tuple(sorted({round(t, 3) for t in starts if t and t > 0}))
+    if not starts:
+        return []
+    st = src.stat()
+    key = (str(src), st.st_mtime_ns, st.st_size, starts)
+    cached = _keyframe_cache.get(key)
+    if cached is not None:
+        return cached
+    _ensure_ffmpeg()
+    intervals = []
+    for t in starts:
+        lo = max(t - _KEYFRAME_WINDOW, 0.0)
+        intervals.append(f"{lo:.3f}%+{t - lo + 0.001:.3f}")
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-read_intervals", ",".join(intervals),
+           "-show_entries", "packet=pts_time,dts_time,flags:format=start_time", "-of", "json", str(src)]
+    try:
+        out = subprocess.check_output(cmd)
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    data = _json.loads(out)
+    try:
+        origin = float((data.get("format") or {}).get("start_time") or 0.0)
+    except ValueError:
+        origin = 0.0
+    kfs = set()
+    for pkt in data.get("packets", []):
+        if "K" not in (pkt.get("flags") or ""):
+            continue
+        t = pkt.get("pts_time") or pkt.get("dts_time")
+        try:
+            kfs.add(float(t) - origin)
+        except (TypeError, ValueError):
+            continue
+    _keyframe_cache[key] = sorted(kfs)
+    return _keyframe_cache[key]
+
+def _snap_to_keyframe(t: float, keyframes: List[float]) -> float:
+    """Latest keyframe at or before t (t itself if none is known)."""
+    i = bisect.bisect_right(keyframes, t + 1e-3) - 1
+    return keyframes[i] if i >= 0 else t
+
+class _ProgressBar:
+    """One bar across all concurrent ffmpeg jobs, fed with each job's output position (seconds)."""
+
+    def __init__(self, total: Optional[float]):
+        self.total = total if total and total > 0 else None
+        self._done: Dict[int, float] = {}
+        self._sum = 0.0
+        self._last_pct = -1
+        self._bar = None
+        if tqdm is not None:
+            self._bar = tqdm(total=self.total, unit="s", unit_scale=True, leave=False,
+                             bar_format="  {l_bar}{bar}| {n:.0f}/{total:.0f}s [{elapsed}<{remaining}]"
+                             if self.total else None)
+
+    def update(self, job: int, seconds: float) -> None:
+        self._sum += seconds - self._done.get(job, 0.0)
+        self._done[job] = seconds
+        if self._bar is not None:
+            self._bar.n = min(self._sum, self.total) if self.total else self._sum
+            self._bar.refresh()
+        elif self.total:
+            pct = min(int(self._sum * 100 / self.total), 100)
+            if pct != self._last_pct:
+                self._last_pct = pct
+                print(f"\r  … {pct:3d}%", end="", flush=True)
+
+    def close(self) -> None:
+        if self._bar is not None:
+            self._bar.close()
+        elif self._last_pct >= 0:
+            print("\r" + " " * 12 + "\r", end="", flush=True)
+
+async def _run_ffmpeg(cmd: List[str], on_progress: Optional[Callable[[float], None]] = None) -> Tuple[int, str]:
+    """Run one ffmpeg command on the event loop; return (returncode, stderr text).
+
+    With on_progress, ffmpeg's `-progress` key=value stream is read incrementally and the
+    output position (seconds) is reported as it advances.
+    """
+    if on_progress is not None:
+        cmd = cmd[:1] + ["-progress", "pipe:1", "-nostats"] + cmd[1:]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE if on_progress is not None else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def _read_progress() -> None:
+        async for raw in proc.stdout:
+            key, _, value = raw.decode("ascii", errors="ignore").strip().partition("=")
+            if key in ("out_time_us", "out_time_ms"):  # both are in microseconds
+                try:
+                    on_progress(int(value) / 1_000_000)
+                except ValueError:
+                    pass  # "N/A" until the first packet is written
+
+    try:
+        if on_progress is None:
+            _, err = await proc.communicate()
+        else:
+            # drain stderr alongside stdout so neither pipe can fill up and stall ffmpeg
+            err, _ = await asyncio.gather(proc.stderr.read(), _read_progress())
+            await proc.wait()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()  # reap it before the loop shuts down: no zombies or closed-loop warnings
+        raise
+    return proc.returncode, err.decode("utf-8", errors="ignore").strip()
+
+async def _run_ffmpeg_jobs(
+    jobs: List[Tuple[List[str], Path]], max_workers: int, durations: Optional[List[Optional[float]]] = None
+) -> None:
+    """Run independent ffmpeg commands concurrently (bounded by a semaphore); report results in chapter order.
+
+    `durations` (seconds per job) sizes the shared progress bar.
+    """
+    sem = asyncio.Semaphore(max(1, max_workers))
+    bar = _ProgressBar(sum(d for d in durations if d) if durations else None)
+
+    async def _run_one(job: int, cmd: List[str], out_path: Path) -> str:
+        async with sem:
+            rc, err = await _run_ffmpeg(cmd, on_progress=lambda t: bar.update(job, t))
+        if rc == 0:
+            return f"  ✔ {out_path.name}"
+        return f"  ✖ Failed: {out_path.name} ({err or f'ffmpeg exited with status {rc}'})"
+
+    try:
+        messages = await asyncio.gather(*(_run_one(i, cmd, out_path) for i, (cmd, out_path) in enumerate(jobs)))
+    finally:
+        bar.close()
+    for msg in messages:
+        print(msg)
+
+# output extension -> ffmpeg encoder used when re-encoding
+_AUDIO_CODEC_MAP = MappingProxyType({
+    "flac": "flac",
+    "wav": "pcm_s16le",
+    "mp3": "libmp3lame",
+    "m4a": "aac",
+    "opus": "libopus",
+})
+
+# output extension -> source codec that can be stream-copied into it as-is
+_COPYABLE_AUDIO_CODECS = {"opus": "opus", "m4a": "aac", "mp3": "mp3", "flac": "flac"}
+
+def _can_copy_audio(acodec: Optional[str], out_ext: str) -> bool:
+    return acodec is not None and _COPYABLE_AUDIO_CODECS.get(out_ext) == acodec
+
 def _choose_container_for_copy(preferred: str, vcodec: Optional[str], acodec: Optional[str]) -> str:
     preferred = preferred.lower()
     if preferred == "mkv":
@@ -157,88 +368,312 @@ def _choose_container_for_copy(preferred: str, vcodec: Optional[str], acodec: Op
         return "mkv"  # fallback
     return "mkv"
 
-def split_audio_with_ffmpeg(
+def _chapters_are_contiguous(chapters: List[Dict[str, Any]], tolerance: float = 0.05) -> bool:
+    """True when chapters tile the file from 0 without gaps, i.e. the segment muxer can cut them."""
+    prev_end = 0.0
+    for i, ch in enumerate(chapters):
+        ss = ch.get("start_time") or 0.0
+        if prev_end is None or abs(ss - prev_end) > tolerance:
+            return False
+        prev_end = ch.get("end_time")
+        if prev_end is None and i != len(chapters) - 1:
+            return False
+    return True
+
+async def _split_audio_single_pass(
     src: Path,
     out_folder: Path,
     chapters: List[Dict[str, Any]],
-    template_with_num: bool,
+    out_paths: List[Path],
     out_ext: str,
     audio_codec: str,
     bitrate_kbps: Optional[str],
-):
-    _ensure_ffmpeg()
-    out_folder.mkdir(parents=True, exist_ok=True)
+) -> bool:
+    """Emit every chapter with ONE ffmpeg run via the segment muxer; False means 'use the per-chapter path'.
+
+    Reads src directly (re-encode or stream copy), so the chapters must tile the file.
+    """
+    tmp_dir = Path(tempfile.mkdtemp(prefix=".segments-", dir=str(out_folder)))
+    try:
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", str(src)]
+        cmd += ["-vn", "-map", "a", "-c:a", audio_codec]
+        if bitrate_kbps and audio_codec not in {"flac", "pcm_s16le", "copy"}:
+            cmd += ["-b:a", f"{bitrate_kbps}k"]
+        last_end = chapters[-1].get("end_time")
+        if last_end is not None:
+            cmd += ["-t", _ts(last_end)]
+        segment_times = ",".join(_ts(ch["start_time"]) for ch in chapters[1:])
+        cmd += ["-f", "segment", "-segment_times", segment_times, "-reset_timestamps", "1"]
+        cmd += [str(tmp_dir / f"%03d.{out_ext}")]
+
+        bar = _ProgressBar(last_end)
+        try:
+            rc, err = await _run_ffmpeg(cmd, on_progress=lambda t: bar.update(0, t))
+        finally:
+            bar.close()
+        if rc != 0:
+            print(f"ℹ Single-pass split failed ({err or f'ffmpeg exited with status {rc}'}). Falling back to per-chapter split.")
+            return False
+
+        # the segment muxer numbers its outputs in chapter order
+        segments = [tmp_dir / f"{i:03d}.{out_ext}" for i in range(len(chapters))]
+        if not all(seg.is_file() for seg in segments):
+            print("ℹ Single-pass split produced an unexpected number of files. Falling back to per-chapter split.")
+            return False
+        for seg, out_path in zip(segments, out_paths):
+            os.replace(seg, out_path)
+            print(f"  ✔ {out_path.name}")
+        return True
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# --- optional hardware encode (opt-in: YT_DL_SPLITTER_HWACCEL=cuda|vaapi) ---
 
+HWACCEL_ENV = "YT_DL_SPLITTER_HWACCEL"
+_HW_MAX_SESSIONS = 3  # consumer GPUs cap concurrent encode sessions
+_ffmpeg_encoders: Optional[set] = None
+
+def _ffmpeg_has_encoder(name: str) -> bool:
+    """Check `ffmpeg -encoders` once per process and look the encoder up in the cached list."""
+    global _ffmpeg_encoders
+    if _ffmpeg_encoders is None:
+        try:
+            out = subprocess.run(
+                ["ffmpeg", "-hide_banner", "-encoders"],
+                check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            ).stdout.decode("utf-8", errors="ignore")
+        except (OSError, subprocess.CalledProcessError):
+            out = ""
+        _ffmpeg_encoders = {line.split()[1] for line in out.splitlines() if len(line.split()) > 1}
+    return name in _ffmpeg_encoders
+
+def _nvenc_available() -> bool:
+    return _ffmpeg_has_encoder("h264_nvenc")
+
+def _hw_encode_args(prefer_hw: bool) -> Optional[Tuple[List[str], List[str]]]:
+    """(input_args, video_codec_args) for the GPU H.264 encoder requested via env, or None."""
+    if not prefer_hw:
+        return None
+    mode = os.environ.get(HWACCEL_ENV, "").strip().lower()
+    if mode == "cuda" and _nvenc_available():
+        return (["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"],
+                ["-c:v", "h264_nvenc", "-preset", "p4", "-b:v", "8M"])
+    if mode == "vaapi" and _ffmpeg_has_encoder("h264_vaapi"):
+        return (["-vaapi_device", "/dev/dri/renderD128"],
+                ["-vf", "format=nv12,hwupload", "-c:v", "h264_vaapi", "-b:v", "8M"])
+    return None
+
+class _VideoPlan(NamedTuple):
+    container: str
+    in_args: List[str]
+    codec_args: List[str]
+    stream_copy: bool
+
+def _plan_video_output(
+    preferred: str, vcodec: Optional[str], acodec: Optional[str], prefer_hw: bool
+) -> _VideoPlan:
+    """How to write the source into the preferred container: stream copy, or a GPU re-encode."""
+    container = _choose_container_for_copy(preferred, vcodec, acodec)
+    if container == preferred:
+        return _VideoPlan(container, [], ["-c", "copy"], stream_copy=True)
+    # only MP4 can hold the H.264 that the GPU encoders produce (WEBM needs VP8/VP9/AV1)
+    hw = _hw_encode_args(prefer_hw) if preferred == "mp4" else None
+    if hw is not None:
+        in_args, v_args = hw
+        if acodec in {"aac", "mp3", "alac", None}:
+            a_args = ["-c:a", "copy"]
+        else:
+            a_args = ["-c:a", "aac", "-b:a", "192k"]
+        print(f"ℹ Streams ({vcodec}/{acodec}) don't fit '{preferred}'. Re-encoding video on the GPU to keep {preferred.upper()}.")
+        return _VideoPlan(preferred, in_args, v_args + a_args, stream_copy=False)
+    print(f"ℹ Selected container '{preferred}' not compatible with streams ({vcodec}/{acodec}). Falling back to MKV copy.")
+    return _VideoPlan(container, [], ["-c", "copy"], stream_copy=True)
+
+class _PreparedChapter(NamedTuple):
+    start: float
+    end: Optional[float]
+    start_ts: str
+    end_ts: Optional[str]
+    out_path: Path
+
+def _prepare_chapters(
+    chapters: List[Dict[str, Any]], out_folder: Path, ext: str, template_with_num: bool
+) -> List[_PreparedChapter]:
+    """Timestamps and output paths for every chapter, computed once before any ffmpeg dispatch."""
+    prepared = []
     for idx, ch in enumerate(chapters, start=1):
-        ch_title = ch.get("title") or f"Chapter {idx:02d}"
-        safe_title = _sanitize_basename(ch_title)
+        ss = ch.get("start_time") or 0.0
+        ee = ch.get("end_time")
+        safe_title = _sanitize_basename(ch.get("title") or f"Chapter {idx:02d}")
         base_name = f"{idx:02d} - {safe_title}" if template_with_num else safe_title
-        out_path = out_folder / f"{base_name}.{out_ext}"
+        prepared.append(_PreparedChapter(
+            ss, ee, _ts(ss), _ts(ee) if ee is not None else None, out_folder / f"{base_name}.{ext}"
+        ))
+    return prepared
 
-        ss = ch.get("start_time")
-        ee = ch.get("end_time")
-        if ss is None:
-            ss = 0.0
+async def split_audio_with_ffmpeg(
+    src: Path,
+    out_folder: Path,
+    chapters: List[Dict[str, Any]],
+    template_with_num: bool,
+    out_ext: str,
+    audio_codec: str,
+    bitrate_kbps: Optional[str],
+):
+    _ensure_ffmpeg()
+    out_folder.mkdir(parents=True, exist_ok=True)
 
-        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", str(src)]
-        cmd += ["-ss", _ts(ss)]
-        if ee is not None:
-            cmd += ["-to", _ts(ee)]
+    _, acodec = _ffprobe_stream_codecs(src)
+    if _can_copy_audio(acodec, out_ext):
+        print(f"ℹ Source audio is already {acodec}; stream-copying instead of re-encoding.")
+        audio_codec = "copy"
+
+    prepared = _prepare_chapters(chapters, out_folder, out_ext, template_with_num)
+    out_paths = [p.out_path for p in prepared]
+
+    # one ffmpeg process for all chapters when they tile the file; gapped chapters
+    # use the per-chapter path below (exact cuts for both copy and re-encode)
+    if len(chapters) > 1 and _chapters_are_contiguous(chapters):
+        if await _split_audio_single_pass(src, out_folder, chapters, out_paths, out_ext, audio_codec, bitrate_kbps):
+            return
+
+    jobs: List[Tuple[List[str], Path]] = []
+    for p in prepared:
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+        if audio_codec == "copy":
+            # keep source timestamps so -ss/-to after -i cut at exact packets
+            cmd += ["-copyts"]
+        cmd += ["-i", str(src), "-ss", p.start_ts]
+        if p.end_ts is not None:
+            cmd += ["-to", p.end_ts]
         cmd += ["-vn", "-map", "a", "-c:a", audio_codec]
-        if bitrate_kbps and audio_codec not in {"flac", "pcm_s16le"}:
+        if audio_codec == "copy":
+            cmd += ["-avoid_negative_ts", "make_zero"]
+        if bitrate_kbps and audio_codec not in {"flac", "pcm_s16le", "copy"}:
             cmd += ["-b:a", f"{bitrate_kbps}k"]
-        cmd += [str(out_path)]
+        cmd += [str(p.out_path)]
+        jobs.append((cmd, p.out_path))
 
-        try:
-            subprocess.run(cmd, check=True)
-            print(f"  ✔ {out_path.name}")
-        except subprocess.CalledProcessError as e:
-            print(f"  ✖ Failed: {out_path.name} ({e})")
+    if audio_codec == "copy":
+        # stream copy is I/O-bound: one worker per core
+        workers = os.cpu_count() or 1
+    else:
+        # re-encoding (libmp3lame/aac/...) is CPU-bound: leave headroom for the decoders
+        workers = max(1, (os.cpu_count() or 1) // 2)
+    durations = [p.end - p.start if p.end is not None else None for p in prepared]
+    await _run_ffmpeg_jobs(jobs, max_workers=workers, durations=durations)
 
-def split_video_with_ffmpeg_copy(
+async def split_video_with_ffmpeg_copy(
     src: Path,
     out_folder: Path,
     chapters: List[Dict[str, Any]],
     template_with_num: bool,
     preferred_container: str,
+    codecs: Optional[Tuple[Optional[str], Optional[str]]] = None,
+    prefer_hw: bool = True,
 ):
     _ensure_ffmpeg()
     out_folder.mkdir(parents=True, exist_ok=True)
-    vcodec, acodec = _ffprobe_stream_codecs(src)
-    container = _choose_container_for_copy(preferred_container, vcodec, acodec)
-    if container != preferred_container:
-        print(f"ℹ Selected container '{preferred_container}' not compatible with streams ({vcodec}/{acodec}). Falling back to MKV copy.")
+    vcodec, acodec = codecs if codecs is not None else _ffprobe_stream_codecs(src)
+    container, in_args, codec_args, stream_copy = _plan_video_output(preferred_container, vcodec, acodec, prefer_hw)
+    prepared = _prepare_chapters(chapters, out_folder, container, template_with_num)
+    # -c copy can only start on a keyframe: cut there explicitly so the first frames aren't black/desynced
+    keyframes = _keyframe_offsets(src, (p.start for p in prepared)) if stream_copy and vcodec else []
+
+    jobs: List[Tuple[List[str], Path]] = []
+    durations: List[Optional[float]] = []
+    for p in prepared:
+        ss, ee, start_ts, out_path = p.start, p.end, p.start_ts, p.out_path
+        if keyframes:
+            ss = _snap_to_keyframe(ss, keyframes)
+            start_ts = _ts(ss)
+
+        # -ss before -i seeks via the container index instead of demuxing from byte 0;
+        # output timestamps then restart at 0, so the end is given as a duration (-t)
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"] + in_args + ["-ss", start_ts]
+        if ee is not None:
+            cmd += ["-t", _ts(max(ee - ss, 0.0))]
+        cmd += ["-i", str(src)]
+        # stream copy (no re-encode) unless a GPU encode was planned
+        cmd += codec_args + ["-avoid_negative_ts", "make_zero"]
+        cmd += [str(out_path)]
+        jobs.append((cmd, out_path))
+        durations.append(ee - ss if ee is not None else None)
 
-    for idx, ch in enumerate(chapters, start=1):
-        ch_title = ch.get("title") or f"Chapter {idx:02d}"
-        safe_title = _sanitize_basename(ch_title)
-        base_name = f"{idx:02d} - {safe_title}" if template_with_num else safe_title
-        out_path = out_folder / f"{base_name}.{container}"
+    # stream copy is I/O-bound: one worker per core; GPU encodes are session-limited
+    await _run_ffmpeg_jobs(
+        jobs, max_workers=(os.cpu_count() or 1) if stream_copy else _HW_MAX_SESSIONS, durations=durations
+    )
 
-        ss = ch.get("start_time")
-        ee = ch.get("end_time")
-        if ss is None:
-            ss = 0.0
 
-        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", str(src)]
-        cmd += ["-ss", _ts(ss)]
-        if ee is not None:
-            cmd += ["-to", _ts(ee)]
-        # stream copy (no re-encode)
-        cmd += ["-c", "copy"]
-        cmd += [str(out_path)]
+def _place_file(src: Path, dst: Path) -> None:
+    """Put src at dst without a remux: hard link on the same device, else a kernel-side copy.
 
+    The source is kept in place so a later run can still skip the download.
+    """
+    if dst.exists():
+        dst.unlink()
+    if src.stat().st_dev == dst.parent.stat().st_dev:
         try:
-            subprocess.run(cmd, check=True)
-            print(f"  ✔ {out_path.name}")
-        except subprocess.CalledProcessError as e:
-            print(f"  ✖ Failed: {out_path.name} ({e})")
+            os.link(src, dst)
+            return
+        except OSError:
+            pass  # filesystem without hard links
+    shutil.copyfile(src, dst)  # uses sendfile/copy_file_range where the OS offers it
 
 
 # --- yt-dlp helpers ---
 
 KNOWN_SOURCE_EXTS = [".webm", ".m4a", ".mp4", ".ogg", ".opus", ".mkv"]
 
+# options shared by the audio and video downloads (scalars only: yt-dlp mutates nested dicts)
+_BASE_YDL_OPTS = MappingProxyType({
+    "windowsfilenames": True,
+    "trim_file_name": 180,
+    "noplaylist": True,
+    "ignoreerrors": False,
+    "quiet": False,
+    "no_warnings": False,
+    "split_chapters": False,  # we split ourselves
+    "merge_output_format": None,
+    "concurrent_fragment_downloads": 16,
+})
+
+def _build_ydl_opts(out_dir: Path) -> Dict[str, Any]:
+    opts = {
+        **_BASE_YDL_OPTS,
+        "paths": {"home": str(out_dir)},
+        "outtmpl": {"default": "%(title)s.%(ext)s"},
+    }
+    return _use_aria2c_if_available(opts)
+
+def _prepare_download(ydl: YoutubeDL, fmt_selector: str) -> None:
+    """Switch the shared (probe) instance to download mode for the chosen format."""
+    ydl.params["format"] = fmt_selector
+    # YoutubeDL compiles its format selector in __init__, so rebuild it for the new spec
+    ydl.format_selector = ydl.build_format_selector(fmt_selector)
+
+def _use_aria2c_if_available(opts: Dict[str, Any]) -> Dict[str, Any]:
+    """Hand downloads to aria2c (16 parallel connections / range requests) when it is on PATH."""
+    if shutil.which("aria2c"):
+        opts["external_downloader"] = {"default": "aria2c"}
+        opts["external_downloader_args"] = {"aria2c": ["-x", "16", "-s", "16", "-k", "1M"]}
+    return opts
+
+# dir -> (dir mtime_ns, [(name, path)]); re-scanned only when the directory changes
+_dir_listing_cache: Dict[str, Tuple[int, List[Tuple[str, Path]]]] = {}
+
+def _list_files(directory: Path) -> List[Tuple[str, Path]]:
+    key = str(directory)
+    dir_mtime = directory.stat().st_mtime_ns
+    cached = _dir_listing_cache.get(key)
+    if cached is not None and cached[0] == dir_mtime:
+        return cached[1]
+    with os.scandir(directory) as it:
+        files = [(e.name, Path(e.path)) for e in it if e.is_file()]
+    _dir_listing_cache[key] = (dir_mtime, files)
+    return files
+
 def _find_existing_source_loose(title: str, out_dir: Path) -> Optional[Path]:
     """Loose scan for <sanitized title>.* in out_dir with known source extensions."""
     safe = _sanitize_basename(title)
@@ -247,12 +682,24 @@ def _find_existing_source_loose(title: str, out_dir: Path) -> Optional[Path]:
         if p.exists():
             return p
     # fallback: any file starting with safe title
-    matches = list(out_dir.glob(f"{safe}*"))
-    matches = [m for m in matches if m.is_file()]
+    # filter on the cached names first; stat only the hits
+    matches = [p for name, p in _list_files(out_dir) if name.startswith(safe)]
     if matches:
         return max(matches, key=lambda p: p.stat().st_mtime)
     return None
 
+# selection results the probe's own (default) format pass left in the info dict
+_PROBE_SELECTION_KEYS = ("requested_formats", "requested_downloads", "format_id", "url", "ext", "_filename", "filepath")
+
+def _info_for_download(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Probe info cleaned the way --load-info-json does, so the download re-selects formats from scratch."""
+    clean = YoutubeDL.sanitize_info(info, remove_private_keys=True)
+    if clean.get("formats"):
+        # top-level url/ext only matter when there is no formats list to select from
+        for key in _PROBE_SELECTION_KEYS:
+            clean.pop(key, None)
+    return clean
+
 def _resolve_downloaded_file_path(res: Dict[str, Any], ydl: YoutubeDL, out_dir: Path, title: str) -> Optional[Path]:
     # 1) requested_downloads entries contain 'filepath'
     for d in res.get("requested_downloads") or []:
@@ -282,27 +729,18 @@ def _resolve_downloaded_file_path(res: Dict[str, Any], ydl: YoutubeDL, out_dir:
 
 # ------------------------- Main flow -------------------------
 
-def main():
-    print("\n=== Youtube DL Splitter v1.5 ===\n")
-
-    url = prompt_nonempty("Paste a YouTube video URL: ")
-
-    mode = prompt_choice(
-        "\nWhat would you like to download?",
-        [("Video (split into chapter files)", "video"),
-         ("Audio only (split into chapter files)", "audio")]
-    )
-
-    out_dir = ensure_output_dir(prompt_nonempty("\nDestination folder for the files: "))
-
-    # Probe
-    probe_opts = {"paths": {"home": str(out_dir)}, "quiet": True, "noplaylist": True}
-    with YoutubeDL(probe_opts) as probe:
-        try:
-            info = probe.extract_info(url, download=False)
-        except Exception as e:
-            print(f"\nFailed to fetch video info: {e}")
-            sys.exit(1)
+def _download_and_split(ydl: YoutubeDL, url: str, mode: str, out_dir: Path) -> None:
+    # Probe (the resulting info is re-used for the download, so extraction runs only once).
+    # quiet is toggled only around the probe: YoutubeDL picks stdout vs stderr for its
+    # screen output from `quiet` in __init__, so the instance itself is built non-quiet.
+    ydl.params["quiet"] = True
+    try:
+        info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        print(f"\nFailed to fetch video info: {e}")
+        sys.exit(1)
+    finally:
+        ydl.params["quiet"] = False
 
     title = info.get("title") or "YouTube"
     chapters_available = has_chapters(info)
@@ -342,45 +780,36 @@ def main():
         chapter_note = "→ Will split into chapter files." if chapters_available else "→ No chapters detected; will keep single file."
         print(chapter_note)
 
-        ydl_opts_src = {
-            "paths": {"home": str(out_dir)},
-            "outtmpl": {"default": "%(title)s.%(ext)s"},
-            "windowsfilenames": True,
-            "trim_file_name": 180,
-            "format": fmt_selector,
-            "noplaylist": True,
-            "ignoreerrors": False,
-            "quiet": False,
-            "no_warnings": False,
-            "split_chapters": False,  # we split ourselves
-            "merge_output_format": None,
-        }
-
-        with YoutubeDL(ydl_opts_src) as ydl:
-            res = ydl.extract_info(url, download=True)
-            src = _resolve_downloaded_file_path(res, ydl, out_dir, title)
-            if not src or not Path(src).exists():
-                print("✖ Could not find downloaded source video file.")
-                sys.exit(1)
+        _prepare_download(ydl, fmt_selector)
+        res = ydl.process_ie_result(_info_for_download(info), download=True)
+        src = _resolve_downloaded_file_path(res, ydl, out_dir, title)
+        if not src or not Path(src).exists():
+            print("✖ Could not find downloaded source video file.")
+            sys.exit(1)
 
         out_folder = out_dir / _sanitize_basename(title)
+        vcodec, acodec = _ffprobe_stream_codecs(src)
         if chapters_available:
-            split_video_with_ffmpeg_copy(
+            asyncio.run(split_video_with_ffmpeg_copy(
                 src=src,
                 out_folder=out_folder,
                 chapters=info["chapters"],
                 template_with_num=dupes,
                 preferred_container=video_container,
-            )
+                codecs=(vcodec, acodec),
+            ))
         else:
             # just move/remux single file to chosen container if needed
             _ensure_ffmpeg()
-            vcodec, acodec = _ffprobe_stream_codecs(src)
-            container = _choose_container_for_copy(video_container, vcodec, acodec)
+            container, in_args, codec_args, stream_copy = _plan_video_output(video_container, vcodec, acodec, prefer_hw=True)
             out_path = out_folder / f"{_sanitize_basename(title)}.{container}"
             out_folder.mkdir(parents=True, exist_ok=True)
-            cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", str(src), "-c", "copy", str(out_path)]
-            subprocess.run(cmd, check=True)
+            if stream_copy and container == src.suffix.lstrip(".").lower():
+                # container already matches: no remux needed, just place the file
+                _place_file(src, out_path)
+            else:
+                cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"] + in_args + ["-i", str(src)] + codec_args + [str(out_path)]
+                subprocess.run(cmd, check=True)
             print(f"  ✔ {out_path.name}")
 
         print("\n✅ Done!")
@@ -409,38 +838,19 @@ def main():
     if not chapters_available:
         print("\n⚠ No chapters found in this video. Will download and convert the full audio only.\n")
 
-    ydl_opts_src = {
-        "paths": {"home": str(out_dir)},
-        "outtmpl": {"default": "%(title)s.%(ext)s"},
-        "windowsfilenames": True,
-        "trim_file_name": 180,
-        "format": "bestaudio/best",
-        "noplaylist": True,
-        "ignoreerrors": False,
-        "quiet": False,
-        "no_warnings": False,
-        "split_chapters": False,  # we split ourselves
-    }
-    with YoutubeDL(ydl_opts_src) as ydl:
-        print("↓ Downloading source audio (or reusing existing)...")
-        res = ydl.extract_info(url, download=True)
-        src = _resolve_downloaded_file_path(res, ydl, out_dir, title)
-        if not src or not Path(src).exists():
-            print("✖ Could not find downloaded source file.")
-            sys.exit(1)
+    _prepare_download(ydl, "bestaudio/best")
+    print("↓ Downloading source audio (or reusing existing)...")
+    res = ydl.process_ie_result(_info_for_download(info), download=True)
+    src = _resolve_downloaded_file_path(res, ydl, out_dir, title)
+    if not src or not Path(src).exists():
+        print("✖ Could not find downloaded source file.")
+        sys.exit(1)
 
     out_folder = out_dir / _sanitize_basename(title)
     if chapters_available:
         print("→ Splitting into chapter files with ffmpeg...")
-        codec_map = {
-            "flac": "flac",
-            "wav": "pcm_s16le",
-            "mp3": "libmp3lame",
-            "m4a": "aac",
-            "opus": "libopus",
-        }
-        ff_codec = codec_map[audio_container]
-        split_audio_with_ffmpeg(
+        ff_codec = _AUDIO_CODEC_MAP[audio_container]
+        asyncio.run(split_audio_with_ffmpeg(
             src=src,
             out_folder=out_folder,
             chapters=info["chapters"],
@@ -448,22 +858,18 @@ def main():
             out_ext=audio_container,
             audio_codec=ff_codec,
             bitrate_kbps=bitrate,
-        )
+        ))
     else:
         # convert whole file to chosen audio format
         _ensure_ffmpeg()
         out_path = out_folder / f"{_sanitize_basename(title)}.{audio_container}"
         out_folder.mkdir(parents=True, exist_ok=True)
-        codec_map = {
-            "flac": "flac",
-            "wav": "pcm_s16le",
-            "mp3": "libmp3lame",
-            "m4a": "aac",
-            "opus": "libopus",
-        }
-        ff_codec = codec_map[audio_container]
+        ff_codec = _AUDIO_CODEC_MAP[audio_container]
+        _, acodec = _ffprobe_stream_codecs(src)
+        if _can_copy_audio(acodec, audio_container):
+            ff_codec = "copy"
         cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", str(src), "-vn", "-map", "a", "-c:a", ff_codec]
-        if bitrate and ff_codec not in {"flac", "pcm_s16le"}:
+        if bitrate and ff_codec not in {"flac", "pcm_s16le", "copy"}:
             cmd += ["-b:a", f"{bitrate}k"]
         cmd += [str(out_path)]
         subprocess.run(cmd, check=True)
@@ -472,6 +878,25 @@ def main():
     print("\n✅ Done!")
 
 
+def main():
+    print("\n=== Youtube DL Splitter v1.5 ===\n")
+
+    url = prompt_nonempty("Paste a YouTube video URL: ")
+
+    mode = prompt_choice(
+        "\nWhat would you like to download?",
+        [("Video (split into chapter files)", "video"),
+         ("Audio only (split into chapter files)", "audio")]
+    )
+
+    out_dir = ensure_output_dir(prompt_nonempty("\nDestination folder for the files: "))
+
+    # One YoutubeDL for probe and download: player-JS/signature caches and the
+    # HTTP keep-alive connection pool are shared instead of rebuilt.
+    with YoutubeDL(_build_ydl_opts(out_dir)) as ydl:
+        _download_and_split(ydl, url, mode, out_dir)
+
+
 if __name__ == "__main__":
     try:
         main()